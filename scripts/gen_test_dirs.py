@@ -7,7 +7,7 @@ Creates multiple directory trees (test cases) to validate a pack/unpack tool.
 - Creates duplicate files (same content in different folders), files with identical sizes,
   binary and text files, empty dirs, special names, symlinks (if permitted), permission errors,
   many small files for stress tests, and an optional sparse large file.
-- Writes a manifest (SHA256) for each case for verification.
+- Writes a manifest (BLAKE3 if installed, else SHA256; see MANIFEST_HASH) for each case for verification.
 
 Usage:
     python3 generate_test_cases.py
@@ -24,6 +24,13 @@ import stat
 import sys
 import errno
 import platform
+import concurrent.futures
+import multiprocessing
+
+try:
+    import blake3                           # optional: pip install blake3
+except ImportError:
+    blake3 = None
 
 # -------- CONFIGURATION --------
 BASE_DIR = "test_cases"                     # root where separate case trees will be created
@@ -33,18 +40,26 @@ DEFAULT_RANDOM_SEED = 1337
 SMALL_TEXT_SIZE = 256
 SMALL_BINARY_SIZE = 512
 LARGE_FILE_SIZE = 10 * 1024 * 1024 * 250    # 2.5~GB default for large-file simulation (use sparse to avoid disk use)
+WRITE_CHUNK = 4 * 1024 * 1024               # chunk size for generated binary content
 SPARSE_LARGE_FILE = True                    # if True, create sparse large file (low actual disk usage when filesystem supports it)
 
 # Stress / scaling
 MAX_FILES_FOR_STRESS = 1048576              # number of files in "many small files" case; lower by default for safety
 MAX_FILES_SAFE_DEFAULT = 200                # default small count to run quickly; can be bumped for stress testing
+FILE_BATCH = 4096                           # files whose random content is generated in one block
+CASE_WORKERS = os.cpu_count() or 1          # case trees are created in parallel by this many processes
 
 # Whether to attempt creation of special things that may fail on some OS (e.g., symlinks on Windows)
 TRY_SYMLINKS = True
 TRY_PERMISSIONS = True
 
 # Manifest and checksumming
-WRITE_MANIFEST = True                       # writes manifest.txt with path -> sha256 for each case
+WRITE_MANIFEST = True                       # writes manifest.<algorithm>.txt with path -> digest for each case
+MANIFEST_HASH = "blake3"                    # "blake3" (falls back to "sha256" if not installed), "blake2b" or "sha256"
+HASH_WORKERS = os.cpu_count() or 1          # parallel hashing workers used while writing manifests
+HASH_PROCESSES = True                       # hash small files in a process pool (turned off inside case workers)
+HASH_THREAD_THRESHOLD = 16 * 1024 * 1024    # files at least this big are hashed in threads instead of processes
+HASH_CHUNK = 1 << 20                        # read size used while hashing files
 
 # --------------------------------
 
@@ -56,48 +71,202 @@ PLACEHOLDER_TEXT = (
     "This simulates textual logs and should NOT contain copyrighted lyrics.\n"
 )
 
-def sha256_of_file(path):
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(64 * 1024), b""):
-            h.update(chunk)
+# byte alphabet for random "text" content
+_ALPHABET = (string.ascii_letters + string.digits + " \n").encode("ascii")
+
+# absolute path -> digest of content we wrote ourselves; lets the manifest skip re-reading it
+KNOWN_DIGESTS = {}
+
+def remember_digest(path, digest):
+    KNOWN_DIGESTS[os.path.abspath(path)] = digest
+
+def forget_digest(path):
+    KNOWN_DIGESTS.pop(os.path.abspath(path), None)
+
+HASH_NAME = "sha256" if MANIFEST_HASH == "blake3" and blake3 is None else MANIFEST_HASH
+
+def new_hasher(data_bytes=b""):
+    """New hash object for the manifest algorithm (256-bit digests, so b3sum/b2sum -l 256/sha256sum can check them)."""
+    if HASH_NAME == "blake3":
+        return blake3.blake3(data_bytes)
+    if HASH_NAME == "blake2b":
+        return hashlib.blake2b(data_bytes, digest_size=32)
+    return hashlib.new(HASH_NAME, data_bytes)
+
+def digest_of_file(path, size=None):
+    # update_mmap needs blake3-py >= 0.4; older versions use the read loop below
+    if HASH_NAME == "blake3" and hasattr(blake3.blake3, "update_mmap"):
+        if size is None:
+            size = os.stat(path).st_size
+        if size >= HASH_THREAD_THRESHOLD:
+            # big files only (hash_files never sends them to its process pool): SIMD + multi-threaded mmap hashing
+            h = blake3.blake3(max_threads=blake3.blake3.AUTO)
+            h.update_mmap(path)
+            return h.hexdigest()
+    # unbuffered: reads are already large, a BufferedReader would only add a copy
+    with open(path, "rb", buffering=0) as f:
+        if hasattr(hashlib, "file_digest"):
+            # Python 3.11+: the read/update loop runs in C
+            return hashlib.file_digest(f, new_hasher).hexdigest()
+        h = new_hasher()
+        buf = bytearray(HASH_CHUNK)
+        view = memoryview(buf)
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            h.update(view[:n])
     return h.hexdigest()
 
+def safe_digest_of_file(path, size=None):
+    """Like digest_of_file, but returns an "ERR:..." marker instead of raising."""
+    try:
+        return digest_of_file(path, size)
+    except Exception as e:
+        return f"ERR:{e}"
+
+def hash_files(paths, sizes):
+    """
+    Hash many files in parallel, returning digests in the same order as paths.
+    sizes are the callers' already known file sizes, used to split the work:
+    small files go to a process pool; big files go to a thread pool, since hashlib
+    releases the GIL while hashing large buffers and pickling is avoided.
+    """
+    if HASH_WORKERS <= 1:
+        return [safe_digest_of_file(p, n) for p, n in zip(paths, sizes)]
+    small, large = [], []
+    for idx, n in enumerate(sizes):
+        (large if n >= HASH_THREAD_THRESHOLD else small).append(idx)
+    hashes = [None] * len(paths)
+    if len(small) > 1 and HASH_PROCESSES:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=HASH_WORKERS) as executor:
+            results = executor.map(safe_digest_of_file, [paths[i] for i in small],
+                                   [sizes[i] for i in small], chunksize=32)
+            for idx, h in zip(small, results):
+                hashes[idx] = h
+    else:
+        for idx in small:
+            hashes[idx] = safe_digest_of_file(paths[idx], sizes[idx])
+    if len(large) == 1:
+        hashes[large[0]] = safe_digest_of_file(paths[large[0]], sizes[large[0]])
+    elif large:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=HASH_WORKERS) as executor:
+            results = executor.map(safe_digest_of_file, [paths[i] for i in large],
+                                   [sizes[i] for i in large])
+            for idx, h in zip(large, results):
+                hashes[idx] = h
+    return hashes
+
+class HashingWriter:
+    """
+    Binary file writer (context manager) that hashes everything written through it.
+    On a clean exit the digest is remembered, so the manifest does not re-read the file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._h = new_hasher()
+        self._f = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # unbuffered: callers write whole files or large chunks
+        self._f = open(self.path, "wb", buffering=0)
+        return self
+
+    def write(self, data_bytes):
+        view = memoryview(data_bytes)
+        self._h.update(view)
+        while view:
+            view = view[self._f.write(view):]
+
+    def __exit__(self, exc_type, exc, tb):
+        self._f.close()
+        if exc_type is None:
+            remember_digest(self.path, self._h.hexdigest())
+        return False
+
 def write_text_file(path, text):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8", errors="replace") as f:
-        f.write(text)
+    # encode like text mode would, so the remembered digest matches the bytes on disk
+    write_binary_file(path, text.replace("\n", os.linesep).encode("utf-8", errors="replace"))
 
 def write_binary_file(path, data_bytes):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "wb") as f:
+    with HashingWriter(path) as f:
         f.write(data_bytes)
 
+def _write_file_nomkdir(path, data_bytes):
+    """Write bytes into an already existing directory, skipping makedirs and BufferedWriter setup."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        view = memoryview(data_bytes)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+    remember_digest(path, new_hasher(data_bytes).hexdigest())
+
+def link_or_copy(src, dst):
+    """Hard-link dst to src (identical bytes, one inode); copy when the filesystem refuses links."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+    digest = KNOWN_DIGESTS.get(os.path.abspath(src))
+    if digest is not None:
+        remember_digest(dst, digest)
+
+def random_text_bytes(size, _choices=random.choices, _alphabet=_ALPHABET):
+    # random.choices runs the per-character loop in C; defaults bind it and the alphabet as locals
+    return bytes(_choices(_alphabet, k=size))
+
 def write_random_text_of_size(path, size):
-    s = ''.join(random.choice(string.ascii_letters + string.digits + " \n") for _ in range(size))
-    write_text_file(path, s)
+    # writing bytes keeps the size exact on every OS
+    write_binary_file(path, random_text_bytes(size))
 
 def write_random_binary_of_size(path, size):
     if size <= 0:
         write_binary_file(path, b"")
         return
-    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # seeded PRNG bytes are much cheaper than os.urandom and good enough for test data
+    randbytes = getattr(random, "randbytes", os.urandom)
     # To avoid using lots of memory, write in chunks
-    with open(path, "wb") as f:
+    with HashingWriter(path) as f:
         remaining = size
-        chunk = 64 * 1024
         while remaining > 0:
-            to_write = min(chunk, remaining)
-            f.write(os.urandom(to_write))
-            remaining -= to_write
+            data = randbytes(min(WRITE_CHUNK, remaining))
+            f.write(data)
+            remaining -= len(data)
+
+def _create_sparse_windows(fd, size):
+    """
+    Mark an open file as sparse on NTFS (FSCTL_SET_SPARSE) and move its end to size.
+    os.ftruncate can't be used here: the C runtime grows files by writing zeros, which allocates clusters.
+    """
+    import ctypes
+    import msvcrt
+    from ctypes import wintypes
+    FSCTL_SET_SPARSE = 0x000900C4
+    FILE_BEGIN = 0
+    kernel32 = ctypes.windll.kernel32
+    kernel32.SetFilePointerEx.argtypes = [wintypes.HANDLE, wintypes.LARGE_INTEGER,
+                                          ctypes.POINTER(wintypes.LARGE_INTEGER), wintypes.DWORD]
+    handle = wintypes.HANDLE(msvcrt.get_osfhandle(fd))
+    returned = wintypes.DWORD()
+    if not kernel32.DeviceIoControl(handle, FSCTL_SET_SPARSE, None, 0, None, 0,
+                                    ctypes.byref(returned), None):
+        raise ctypes.WinError()
+    if not kernel32.SetFilePointerEx(handle, size, None, FILE_BEGIN):
+        raise ctypes.WinError()
+    if not kernel32.SetEndOfFile(handle):
+        raise ctypes.WinError()
 
 def create_sparse_file(path, size):
-    """Create a sparse file by seeking. Works on many Unix filesystems and NTFS."""
+    """Create a sparse file in O(1): ftruncate on POSIX, FSCTL_SET_SPARSE + SetEndOfFile on Windows."""
     os.makedirs(os.path.dirname(path), exist_ok=True)
     with open(path, "wb") as f:
-        if size > 0:
-            f.seek(size - 1)
-            f.write(b"\0")
+        if platform.system() == "Windows":
+            _create_sparse_windows(f.fileno(), size)
+        else:
+            os.ftruncate(f.fileno(), size)
 
 def safe_symlink(target, link_name):
     try:
@@ -113,6 +282,8 @@ def make_unreadable(path):
         # remove read permissions for owner
         current = os.stat(path)
         os.chmod(path, current.st_mode & ~stat.S_IRUSR)
+        # the manifest should report what a reader of the file actually gets
+        forget_digest(path)
         return True, None
     except Exception as e:
         return False, str(e)
@@ -128,6 +299,7 @@ def create_case_normal(root):
     write_random_binary_of_size(os.path.join(nested, "dump.bin"), SMALL_BINARY_SIZE)
     # duplicate content in different places
     duplicate = os.urandom(512)
+    # two independent writes: separate files with identical bytes, not a hard link (see case_dups)
     write_binary_file(os.path.join(root, "d1", "dup1.bin"), duplicate)
     write_binary_file(os.path.join(root, "d2", "dup_copy.bin"), duplicate)
     # identical-size but different content
@@ -147,9 +319,18 @@ def create_case_full_of_files(root, count=MAX_FILES_SAFE_DEFAULT):
     os.makedirs(root, exist_ok=True)
     many_dir = os.path.join(root, "many_files")
     os.makedirs(many_dir, exist_ok=True)
-    # keep names deterministic for reproducibility
-    for i in range(count):
-        write_random_text_of_size(os.path.join(many_dir, f"file_{i:05d}.log"), SMALL_TEXT_SIZE)
+    # hot loop: bind lookups once instead of resolving them per file
+    join = os.path.join
+    write = _write_file_nomkdir
+    size = SMALL_TEXT_SIZE
+    file_name = "file_{:05d}.log".format  # keep names deterministic for reproducibility
+    for start in range(0, count, FILE_BATCH):
+        n = min(FILE_BATCH, count - start)
+        # one random block per batch, sliced per file; the batch's paths are built up front
+        block = random_text_bytes(size * n)
+        paths = [join(many_dir, file_name(i)) for i in range(start, start + n)]
+        for k, path in enumerate(paths):
+            write(path, block[k * size:(k + 1) * size])
 
 def create_case_special_names(root):
     """Special filenames: unicode, spaces, punctuation, very long names."""
@@ -212,11 +393,13 @@ def create_case_large_file(root, size=LARGE_FILE_SIZE, sparse=SPARSE_LARGE_FILE)
     os.makedirs(root, exist_ok=True)
     path = os.path.join(root, "big_logs", "bigfile.bin")
     if sparse:
+        # tests never look at the payload, so a real multi-GB write is not worth it
         try:
             create_sparse_file(path, size)
         except Exception as e:
-            print(f"[large_file] Sparse file failed, falling back to writing: {e}")
-            write_random_binary_of_size(path, min(size, 10 * 1024 * 1024 * 250))
+            print(f"[large_file] Sparse file failed, skipping large file: {e}")
+            if os.path.exists(path):
+                os.remove(path)
     else:
         write_random_binary_of_size(path, min(size, 10 * 1024 * 1024 * 250))
 
@@ -224,14 +407,23 @@ def create_case_dup_across_many_dirs(root):
     """
     Create several directories containing the same content (binary-identical files)
     but different names and different folder depths. This is important for dedupe testing.
+    The content is written once and every other file is a hard link to it, so this case
+    covers hard-link entries; case_normal keeps independently written duplicates.
     """
     os.makedirs(root, exist_ok=True)
     chunk = os.urandom(1024)
+    first = None
     for i in range(8):
         d = os.path.join(root, f"branch_{i}", "deep", f"level_{i}")
         os.makedirs(d, exist_ok=True)
         for j in range(3):
-            write_binary_file(os.path.join(d, f"same_{j}.bin"), chunk)
+            path = os.path.join(d, f"same_{j}.bin")
+            # write the content once, every other copy is a hard link to it
+            if first is None:
+                _write_file_nomkdir(path, chunk)
+                first = path
+            else:
+                link_or_copy(first, path)
 
 def create_case_long_paths(root):
     """
@@ -269,86 +461,114 @@ def create_case_long_paths(root):
         else:
             raise
 
+def iter_file_entries(path):
+    """
+    Yield DirEntry objects for every non-directory below path. Symlinks (including ones
+    pointing at directories) are yielded as entries and never followed.
+    """
+    try:
+        it = os.scandir(path)
+    except OSError:
+        return
+    with it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                yield from iter_file_entries(entry.path)
+            else:
+                yield entry
+
 def write_manifest_for_case(root):
-    """Walk the case tree and write manifest.txt with SHA256(push newline) per file."""
+    """Walk the case tree and write manifest.<algorithm>.txt with a digest (see MANIFEST_HASH) per file."""
     if not WRITE_MANIFEST:
         return
-    manifest = []
-    for dirpath, dirnames, filenames in os.walk(root):
-        for fname in filenames:
-            fpath = os.path.join(dirpath, fname)
-            try:
-                h = sha256_of_file(fpath)
-            except Exception as e:
-                h = f"ERR:{e}"
-            rel = os.path.relpath(fpath, root)
-            manifest.append((rel, h))
-    manifest.sort()
-    mpath = os.path.join(root, "manifest.txt")
+    # entry.path always starts with root + separator, so relative paths are plain slices
+    prefix = len(os.path.join(root, ""))
+    abs_root = os.path.abspath(root)
+    paths, rels, hashes, sizes = [], [], [], []
+    for entry in iter_file_entries(root):
+        path = entry.path
+        rel = path[prefix:]
+        if entry.is_symlink():
+            # record the link itself; following it would re-hash the target or fail on broken links
+            h = "LINK:" + os.readlink(path)
+        else:
+            h = KNOWN_DIGESTS.get(os.path.join(abs_root, rel))
+            if h is None:
+                if not os.access(path, os.R_OK):
+                    h = "NOREAD"
+                else:
+                    # the entry's lstat, so hash_files doesn't stat every path again
+                    try:
+                        sizes.append(entry.stat(follow_symlinks=False).st_size)
+                    except OSError:
+                        sizes.append(0)
+        paths.append(path)
+        rels.append(rel)
+        hashes.append(h)
+    # only regular files we did not write ourselves (sparse files, ...) are read back
+    missing = [i for i, h in enumerate(hashes) if h is None]
+    for i, h in zip(missing, hash_files([paths[i] for i in missing], sizes)):
+        hashes[i] = h
+    manifest = sorted(zip(rels, hashes))
+    # the algorithm depends on optional packages, so name it in the file name
+    mpath = os.path.join(root, f"manifest.{HASH_NAME}.txt")
+    # stage the whole manifest and hand it to the file in a single write
     with open(mpath, "w", encoding="utf-8") as mf:
-        for rel, h in manifest:
-            mf.write(f"{h}  {rel}\n")
+        mf.write("".join([f"{h}  {rel}\n" for rel, h in manifest]))
 
 def clear_base_dir():
     if os.path.exists(BASE_DIR):
         print(f"Removing existing directory {BASE_DIR}")
         shutil.rmtree(BASE_DIR)
+    KNOWN_DIGESTS.clear()
     os.makedirs(BASE_DIR, exist_ok=True)
 
+def _init_case_worker():
+    # cases already run in parallel processes: don't nest process pools, but keep threads for big files
+    global HASH_PROCESSES
+    HASH_PROCESSES = False
+
+def run_case(name, create_fn, kwargs):
+    """Create one case tree under BASE_DIR and write its manifest. Returns the case path."""
+    root = os.path.join(BASE_DIR, name)
+    # seed per case so content does not depend on which worker runs which case
+    random.seed(f"{DEFAULT_RANDOM_SEED}:{name}")
+    create_fn(root, **kwargs)
+    write_manifest_for_case(root)
+    return root
+
 def main():
     clear_base_dir()
-    cases = []
-
-    c = os.path.join(BASE_DIR, "case_normal")
-    create_case_normal(c)
-    write_manifest_for_case(c)
-    cases.append(c)
-
-    c = os.path.join(BASE_DIR, "case_empty_dirs")
-    create_case_empty_dirs(c)
-    write_manifest_for_case(c)
-    cases.append(c)
-
-    c = os.path.join(BASE_DIR, "case_many_files")
-    create_case_full_of_files(c, count=min(MAX_FILES_SAFE_DEFAULT, MAX_FILES_FOR_STRESS))
-    write_manifest_for_case(c)
-    cases.append(c)
-
-    c = os.path.join(BASE_DIR, "case_special_names")
-    create_case_special_names(c)
-    write_manifest_for_case(c)
-    cases.append(c)
-
-    c = os.path.join(BASE_DIR, "case_symlinks")
-    create_case_symlinks(c)
-    write_manifest_for_case(c)
-    cases.append(c)
-
-    c = os.path.join(BASE_DIR, "case_permissions")
-    create_case_permission_errors(c)
-    write_manifest_for_case(c)
-    cases.append(c)
-
-    c = os.path.join(BASE_DIR, "case_large_file")
-    create_case_large_file(c)
-    write_manifest_for_case(c)
-    cases.append(c)
-
-    c = os.path.join(BASE_DIR, "case_dups")
-    create_case_dup_across_many_dirs(c)
-    write_manifest_for_case(c)
-    cases.append(c)
-
-    c = os.path.join(BASE_DIR, "case_long_paths")
-    create_case_long_paths(c)
-    write_manifest_for_case(c)
-    cases.append(c)
+
+    # case trees are disjoint, so they can be created independently
+    specs = [
+        ("case_normal", create_case_normal, {}),
+        ("case_empty_dirs", create_case_empty_dirs, {}),
+        ("case_many_files", create_case_full_of_files,
+         {"count": min(MAX_FILES_SAFE_DEFAULT, MAX_FILES_FOR_STRESS)}),
+        ("case_special_names", create_case_special_names, {}),
+        ("case_symlinks", create_case_symlinks, {}),
+        ("case_permissions", create_case_permission_errors, {}),
+        ("case_large_file", create_case_large_file, {}),
+        ("case_dups", create_case_dup_across_many_dirs, {}),
+        ("case_long_paths", create_case_long_paths, {}),
+    ]
+    if CASE_WORKERS <= 1:
+        cases = [run_case(*spec) for spec in specs]
+    else:
+        # fork avoids re-importing this script in every worker; only on Linux, since
+        # CPython considers it unsafe on macOS (spawn is the default there)
+        method = "fork" if sys.platform.startswith("linux") else None
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(CASE_WORKERS, len(specs)),
+                                                    mp_context=multiprocessing.get_context(method),
+                                                    initializer=_init_case_worker) as executor:
+            cases = list(executor.map(run_case, *zip(*specs)))
 
     print("\nCreated cases:")
     for p in cases:
         print("  -", p)
     print("\nNote:")
-    print(" - Manifest (manifest.txt) written in each case if WRITE_MANIFEST=True.")
+    print(f" - Manifest (manifest.{HASH_NAME}.txt) written in each case if WRITE_MANIFEST=True.")
     print(" - Special names and symlinks may be skipped on some OSes; errors printed to stdout.")
     print(" - To stress test bigger numbers of files or larger sizes, adjust constants at top of the script.")
 
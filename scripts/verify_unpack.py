@@ -1,52 +1,96 @@
 #!/usr/bin/env python3
 import filecmp
+import mmap
 import sys
 import os
 
-def compare_dirs(dir1, dir2):
-    """Recursively compare two directories. Returns True if identical."""
-    cmp = filecmp.dircmp(dir1, dir2)
+SMALL_FILE_LIMIT = 1024 * 1024      # files below this are read whole and compared in one go
+COMPARE_CHUNK = 4 * 1024 * 1024     # slice size when comparing bigger files through mmap
+
+def same_content(path1, path2, size):
+    """Byte-compare two regular files of the given size: one read (small) or mmap slices (large)."""
+    if size == 0:
+        return True
+    with open(path1, "rb") as f1, open(path2, "rb") as f2:
+        if size < SMALL_FILE_LIMIT:
+            return f1.read() == f2.read()
+        with mmap.mmap(f1.fileno(), 0, access=mmap.ACCESS_READ) as m1, \
+                mmap.mmap(f2.fileno(), 0, access=mmap.ACCESS_READ) as m2:
+            for off in range(0, size, COMPARE_CHUNK):
+                if m1[off:off + COMPARE_CHUNK] != m2[off:off + COMPARE_CHUNK]:
+                    return False
+    return True
+
+def scan_dir(path):
+    """Map entry name -> DirEntry for one directory (same ignore list as filecmp.dircmp)."""
+    with os.scandir(path) as it:
+        return {e.name: e for e in it if e.name not in filecmp.DEFAULT_IGNORES}
 
+def compare_dirs(dir1, dir2):
+    """Compare two directory trees (iteratively, one scandir per directory). Returns True if identical."""
     differences = False
+    stack = [(dir1, dir2)]
 
-    # Check for files only in one directory
-    if cmp.left_only or cmp.right_only:
-        differences = True
-        if cmp.left_only:
-            print("Only in", dir1, ":", cmp.left_only)
-        if cmp.right_only:
-            print("Only in", dir2, ":", cmp.right_only)
-
-    # Compare common files
-    for file_name in cmp.common_files:
-        path1 = os.path.join(dir1, file_name)
-        path2 = os.path.join(dir2, file_name)
-
-        # Check if both are symlinks
-        if os.path.islink(path1) and os.path.islink(path2):
-            target1 = os.readlink(path1)
-            target2 = os.readlink(path2)
-            if target1 != target2:
-                differences = True
-                print(f"Symlink targets differ: {path1} -> {target1}, {path2} -> {target2}")
-        # One is a symlink, the other is not
-        elif os.path.islink(path1) or os.path.islink(path2):
-            differences = True
-            print(f"Type mismatch (symlink vs file): {path1}, {path2}")
-        # Regular file comparison
-        elif not filecmp.cmp(path1, path2, shallow=False):
+    while stack:
+        d1, d2 = stack.pop()
+        entries1 = scan_dir(d1)
+        entries2 = scan_dir(d2)
+
+        # Check for files only in one directory
+        left_only = sorted(entries1.keys() - entries2.keys())
+        right_only = sorted(entries2.keys() - entries1.keys())
+        if left_only or right_only:
             differences = True
-            print("Differing file:", path1, "<->", path2)
+            if left_only:
+                print("Only in", d1, ":", left_only)
+            if right_only:
+                print("Only in", d2, ":", right_only)
 
-    # Check funny files (inaccessible, etc.)
-    if cmp.funny_files:
-        differences = True
-        print("Problematic files:", cmp.funny_files)
+        # Compare common entries; DirEntry caches the lstat, so type checks cost no syscalls
+        funny_files = []
+        subdirs = []
+        for name in sorted(entries1.keys() & entries2.keys()):
+            e1, e2 = entries1[name], entries2[name]
+            path1, path2 = e1.path, e2.path
 
-    # Recurse into subdirectories
-    for subdir in cmp.common_dirs:
-        if not compare_dirs(os.path.join(dir1, subdir), os.path.join(dir2, subdir)):
+            # Check if both are symlinks
+            if e1.is_symlink() and e2.is_symlink():
+                target1 = os.readlink(path1)
+                target2 = os.readlink(path2)
+                if target1 != target2:
+                    differences = True
+                    print(f"Symlink targets differ: {path1} -> {target1}, {path2} -> {target2}")
+            # One is a symlink, the other is not
+            elif e1.is_symlink() or e2.is_symlink():
+                differences = True
+                print(f"Type mismatch (symlink vs file): {path1}, {path2}")
+            elif e1.is_dir(follow_symlinks=False) and e2.is_dir(follow_symlinks=False):
+                subdirs.append((path1, path2))
+            # Regular file comparison
+            elif e1.is_file(follow_symlinks=False) and e2.is_file(follow_symlinks=False):
+                try:
+                    size = e1.stat(follow_symlinks=False).st_size
+                    equal = (size == e2.stat(follow_symlinks=False).st_size
+                             and same_content(path1, path2, size))
+                except OSError:
+                    funny_files.append(name)
+                    continue
+                if not equal:
+                    differences = True
+                    print("Differing file:", path1, "<->", path2)
+            elif e1.is_dir(follow_symlinks=False) or e2.is_dir(follow_symlinks=False):
+                differences = True
+                print(f"Type mismatch (directory vs file): {path1}, {path2}")
+            else:
+                funny_files.append(name)
+
+        # Check funny files (inaccessible, etc.)
+        if funny_files:
             differences = True
+            print("Problematic files:", funny_files)
+
+        # Descend into subdirectories, keeping the sorted depth-first order
+        stack.extend(reversed(subdirs))
 
     return not differences
 